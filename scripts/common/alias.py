@@ -0,0 +1,57 @@
+# Copyright (c) 2025 Reo Yamaguchi
+# All rights reserved.
+# Contact: reo.yamaguchi0607@gmail.com
+"""
+重み付き抽選のための Vose のエイリアス法（手順4・手順7の生成で共通に使う）
+"""
+from __future__ import annotations
+import random
+from typing import List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def build_alias(weights: Sequence[int]) -> Tuple[List[float], List[int]]:
+    """重みを Vose のエイリアス法の表 (prob, alias) に変換する。
+
+    表は一度だけ作り、1 回の抽選は一様乱数 1 個と比較 1 回の O(1) で済む。
+    重みが空か合計が 0 以下なら空の表を返す。
+    """
+    k = len(weights)
+    total = sum(weights)
+    if k == 0 or total <= 0:
+        return [], []
+    prob = [w * k / total for w in weights]
+    alias = list(range(k))
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        si = small.pop()
+        li = large.pop()
+        alias[si] = li
+        prob[li] += prob[si] - 1.0
+        (small if prob[li] < 1.0 else large).append(li)
+    # 丸め誤差で残った列は確率 1 とする
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+def sample_alias(
+    items: Sequence[T],
+    prob: Sequence[float],
+    alias: Sequence[int],
+    n: int,
+    rng: random.Random,
+) -> List[T]:
+    k = len(prob)
+    if k == 0:
+        return []
+    rnd = rng.random
+    out: List[T] = []
+    for _ in range(n):
+        # 一様乱数 1 つの整数部で列を選び、小数部で本体か別名かを決める
+        u = rnd() * k
+        i = int(u)
+        out.append(items[i] if u - i < prob[i] else items[alias[i]])
+    return out
@@ -0,0 +1,79 @@
+# Copyright (c) 2025 Reo Yamaguchi
+# All rights reserved.
+# Contact: reo.yamaguchi0607@gmail.com
+"""
+処理済みテキストの読み込みと有効文字の抽出、集計 CSV の読み書き
+（手順2・手順3の解析で共通に使う）
+"""
+from __future__ import annotations
+import csv
+import itertools
+import re
+import string
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+ALLOWED_BYTES = (string.ascii_letters + " \n").encode("ascii")
+# 有効な文字（A-Z, a-z, 半角スペース, 改行）以外のすべてのバイト
+DISALLOWED_BYTES = bytes(range(256)).translate(None, delete=ALLOWED_BYTES)
+RE_MULTISPACE = re.compile(rb" {2,}")
+
+
+def normalize_spaces(data: bytes) -> bytes:
+    # 連続する半角スペースを 1 つにまとめる（改行はそのまま）
+    return RE_MULTISPACE.sub(b" ", data)
+
+
+def iter_filtered(src_dir: Path) -> Iterator[bytes]:
+    """処理済みファイルを 1 つずつ読み、有効な文字だけにしたバイト列を順に返す。
+
+    コーパス全体を結合せずに済むので、メモリはファイル 1 つ分で足りる。
+    結合してから正規化した場合と同じになるよう、ファイル境界をまたぐ空白もまとめる。
+    """
+    prev_space = False
+    for p in sorted(src_dir.glob("*_processed.txt")):
+        # read_text と同じく改行コード (\r\n, \r) は \n にそろえる
+        data = p.read_bytes().replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        data = normalize_spaces(data)
+        if prev_space and data.startswith(b" "):
+            data = data[1:]
+        if data:
+            prev_space = data.endswith(b" ")
+        yield data.translate(None, delete=DISALLOWED_BYTES)
+
+
+def read_csv_top(path: Path, column: str, top: int | None) -> tuple[list[str], list[int]]:
+    # pandas を使わず、必要な列の上位 top 行だけを csv モジュールで読む
+    with path.open("r", encoding="utf-8", newline="") as f:
+        r = csv.reader(f)
+        header = next(r)
+        ci_label = header.index(column)
+        ci_count = header.index("count")
+        labels: list[str] = []
+        counts: list[int] = []
+        for row in itertools.islice(r, top):
+            labels.append(row[ci_label])
+            counts.append(int(row[ci_count]))
+    return labels, counts
+
+
+def save_freq_csv(
+    counter: Counter,
+    total: int,
+    path: Path,
+    column: str,
+    label: Callable[[str], str] = str,
+) -> None:
+    """出現数の多い順に rank, column, count, ratio の 4 列で CSV に書く。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = [
+        [i, label(key), cnt, f"{cnt/total:.6f}"]
+        for i, (key, cnt) in enumerate(counter.most_common(), start=1)
+    ]
+    # 行をまとめて writerows で書き、大きめのバッファで書き込み回数を減らす
+    with path.open("w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+        w = csv.writer(f)
+        w.writerow(["rank", column, "count", "ratio"])
+        w.writerows(rows)
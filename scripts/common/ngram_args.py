@@ -0,0 +1,62 @@
+# Copyright (c) 2025 Reo Yamaguchi
+# All rights reserved.
+# Contact: reo.yamaguchi0607@gmail.com
+"""
+複数の n をまとめて生成するための引数 --ngrams, --out-pattern（手順5・手順6で共通に使う）
+"""
+from __future__ import annotations
+import argparse
+
+
+def parse_ngrams(s: str) -> list[int]:
+    # "2,3" のようなカンマ区切りの n の並びを受け取る
+    try:
+        ns = [int(x) for x in s.split(",") if x.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"整数のカンマ区切りで指定してください: {s}")
+    if not ns or any(n not in (2, 3) for n in ns):
+        raise argparse.ArgumentTypeError(f"n は 2 または 3 で指定してください: {s}")
+    return ns
+
+
+def add_ngram_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--ngrams",
+        type=parse_ngrams,
+        default=None,
+        help="複数の n をカンマ区切りで指定（例: 2,3）。テキストは一度だけ読み、n ごとに生成する",
+    )
+    p.add_argument(
+        "--out-pattern",
+        default=None,
+        help="n ごとの出力先ファイル。{n} が n に置き換わる（例: out_{n}.txt）",
+    )
+
+
+def ngram_outputs(
+    p: argparse.ArgumentParser, args: argparse.Namespace
+) -> list[tuple[int, str | None]]:
+    """生成する n とその出力先（None は標準出力）の組を返す。
+
+    --out-pattern は生成を始める前に一度だけ展開して確かめ、誤りは使い方のエラー
+    （終了コード 2）にする。呼び出し側は n ごとに同じシードから生成するので、
+    n を 1 つずつ指定して実行した場合と同じ結果になる。
+    """
+    ngrams = args.ngrams or [args.ngram]
+    if not args.out_pattern:
+        if len(ngrams) > 1 and args.out:
+            p.error("複数の n を指定するときは --out ではなく --out-pattern を使ってください")
+        return [(n, args.out) for n in ngrams]
+    try:
+        outs = [args.out_pattern.format(n=n) for n in ngrams]
+    except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+        p.error(
+            f"--out-pattern には {{n}} 以外の置換欄を書けません（波括弧そのものは {{{{ }}}}）: "
+            f"{args.out_pattern} ({e})"
+        )
+    if len(set(outs)) < len(outs):
+        p.error(
+            f"--out-pattern に {{n}} を含めてください（n ごとの出力先が重なります）: "
+            f"{args.out_pattern}"
+        )
+    return list(zip(ngrams, outs))
@@ -4,33 +4,51 @@
 # Contact: reo.yamaguchi0607@gmail.com
 from __future__ import annotations
 import argparse
+import multiprocessing
 import os
 import re
+import string
 from pathlib import Path
 
 
-RE_NON_ALLOWED = re.compile(r"[^A-Za-z \n]")
+ALLOWED = frozenset(string.ascii_letters + " \n")
+# 1 バイト単位の変換表: 許可文字のバイトはそのまま、それ以外は空白 (0x20) にする
+BYTE_TABLE = bytes(b if chr(b) in ALLOWED else 0x20 for b in range(256))
+RE_MULTISPACE = re.compile(rb" {2,}")
+
+
+def process_bytes(data: bytes) -> bytes:
+    # UTF-8 の多バイト文字は各バイトがそれぞれ空白になるが、続く空白のまとめで
+    # 1 つの空白に収まるため、文字単位で置換した場合と結果は同じになる
+    return RE_MULTISPACE.sub(b" ", data.translate(BYTE_TABLE))
 
 
 def process_text(text: str) -> str:
 
-    s = RE_NON_ALLOWED.sub(" ", text)
-    lines = [re.sub(r" {2,}", " ", line) for line in s.splitlines()]
-    return "\n".join(lines) + ("\n" if text.endswith("\n") else "")
+    return process_bytes(text.encode("utf-8", errors="replace")).decode("ascii")
 
 
-def process_file(src_path: Path, dst_path: Path, overwrite: bool = False) -> None:
-    if dst_path.exists() and not overwrite:
-        print(f"Skipping existing output: {dst_path}")
-        return
-    text = src_path.read_text(encoding="utf-8", errors="replace")
-    processed = process_text(text)
+def process_file(
+    src_path: Path,
+    dst_path: Path,
+    overwrite: bool = False,
+    exists: bool | None = None,
+) -> str:
+    # 複数プロセスから呼ばれるので、表示は呼び出し側でまとめて行う。
+    # exists は呼び出し側で出力の有無を調べ済みのときに渡す（None なら stat で確認）
+    if exists is None:
+        exists = dst_path.exists()
+    if exists and not overwrite:
+        return f"Skipping existing output: {dst_path}"
+    # 出力は ASCII のみなので、デコード・エンコードせずバイト列のまま処理する
+    data = src_path.read_bytes().replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    processed = process_bytes(data)
     dst_path.parent.mkdir(parents=True, exist_ok=True)
-    dst_path.write_text(processed, encoding="utf-8")
-    print(f"Wrote: {dst_path} (bytes: {len(processed)})")
+    dst_path.write_bytes(processed)
+    return f"Wrote: {dst_path} (bytes: {len(processed)})"
 
 
-def main() -> None:
+def main(argv: list[str] | None = None) -> None:
     p = argparse.ArgumentParser(
         description="Process Unprocessed texts into processed/ folder"
     )
@@ -45,7 +63,7 @@ def main() -> None:
     p.add_argument(
         "--overwrite", action="store_true", help="Overwrite existing processed files"
     )
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     src_dir = Path(args.src)
     dst_dir = Path(args.dst)
@@ -58,10 +76,17 @@ def main() -> None:
         print(f" {src_dir}にテキストが見つからない")
         return
 
+    # 出力ファイルごとに stat せず、ディレクトリを 1 回読んで既存の名前を集める
+    existing = {e.name for e in os.scandir(dst_dir)} if dst_dir.is_dir() else set()
+    jobs = []
     for src in txt_files:
-        name = src.stem
-        dst = dst_dir / f"{name}_processed.txt"
-        process_file(src, dst, overwrite=args.overwrite)
+        dst = dst_dir / f"{src.stem}_processed.txt"
+        jobs.append((src, dst, args.overwrite, dst.name in existing))
+    # ファイルごとに独立しているのでプロセスを分けて並列に処理する
+    workers = min(len(jobs), os.cpu_count() or 1)
+    with multiprocessing.Pool(workers) as pool:
+        for msg in pool.starmap(process_file, jobs):
+            print(msg)
 
 
 if __name__ == "__main__":
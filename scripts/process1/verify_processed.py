@@ -1,41 +1,53 @@
 #!/usr/bin/env python3
-"""
 # Copyright (c) 2025 Reo Yamaguchi
 # All rights reserved.
 # Contact: reo.yamaguchi0607@gmail.com
 """
-"""
 processed 出力の検証スクリプト (process1 フォルダ版)
 """
 from __future__ import annotations
 import argparse
 import re
+import string
 from pathlib import Path
 import sys
 
 
-RE_ALLOWED = re.compile(r"^[A-Za-z \n]*$", re.MULTILINE)
+ALLOWED_BYTES = (string.ascii_letters + " \n").encode("ascii")
+RE_BAD = re.compile(r"[^A-Za-z \n]")
+DIGIT_BYTES = string.digits.encode("ascii")
 
 
 def check_file_allowed(path: Path) -> tuple[bool, str | None]:
 
-    txt = path.read_text(encoding="utf-8", errors="replace")
-    if RE_ALLOWED.match(txt):
+    data = path.read_bytes()
+    # 許可バイトをすべて削除し、残ったものが不許可文字（C 実装の 1 パス）
+    bad = data.translate(None, delete=ALLOWED_BYTES)
+    if not bad:
         return True, None
 
-    for i, line in enumerate(txt.splitlines(), start=1):
-        if not RE_ALLOWED.match(line + "\n"):
-            bad_chars = sorted(set(re.findall(r"[^A-Za-z \n]", line)))
-            sample = f"line {i}: {line[:200]!r}... bad_chars={bad_chars}"
-            return False, sample
-    return False, "unknown issue"
+    pos = data.index(bad[:1])
+    i = data.count(b"\n", 0, pos) + 1
+    start = data.rfind(b"\n", 0, pos) + 1
+    end = data.find(b"\n", pos)
+    if end == -1:
+        end = len(data)
+    line = data[start:end].decode("utf-8", errors="replace")
+    bad_chars = sorted(set(RE_BAD.findall(line)))
+    sample = f"line {i}: {line[:200]!r}... bad_chars={bad_chars}"
+    return False, sample
+
+
+def has_digits(data: bytes) -> bool:
+    # 数字を削除して長さが変われば数字を含む
+    return len(data.translate(None, delete=DIGIT_BYTES)) != len(data)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(description="Verify processed texts")
     p.add_argument("--src", default="Unprocessed")
     p.add_argument("--dst", default="examples/processed")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     src_dir = Path(args.src)
     dst_dir = Path(args.dst)
@@ -64,18 +76,11 @@ def main() -> int:
         if not ok:
             print(f"NG: {expected} に不許可文字があります -> {sample}")
             overall_ok = False
+        elif has_digits(s.read_bytes()):
+            # 許可文字のみであることは確認済みなので、出力側に数字は残っていない
+            print(f"OK: {expected} （許可文字のみ、数字は除去済）")
         else:
-            s_text = s.read_text(encoding="utf-8", errors="replace")
-            has_digits = bool(re.search(r"\d", s_text))
-            if has_digits:
-                dst_text = expected.read_text(encoding="utf-8", errors="replace")
-                if re.search(r"\d", dst_text):
-                    print(f"警告: {expected} に数字が残っています ")
-                    overall_ok = False
-                else:
-                    print(f"OK: {expected} （許可文字のみ、数字は除去済）")
-            else:
-                print(f"OK: {expected} （許可文字のみ）")
+            print(f"OK: {expected} （許可文字のみ）")
 
     if overall_ok:
         print("\n成功")
@@ -6,56 +6,46 @@ from __future__ import annotations
 import argparse
 from collections import Counter
 from pathlib import Path
-import re
-import csv
-import sys
+from typing import Iterable
 
+from ..common.analysis import iter_filtered, read_csv_top, save_freq_csv
 
-def read_all_texts(src_dir: Path) -> str:
-    parts = []
-    for p in sorted(src_dir.glob("*_processed.txt")):
-        parts.append(p.read_text(encoding="utf-8", errors="replace"))
-    return "".join(parts)
 
+# 表示・CSV 用のラベル（改行と空白は見える形にする）
+LABELS = {"\n": "\\n", " ": "space"}
 
-def normalize_spaces(text: str) -> str:
-    # 連続する半角スペースを 1 つにまとめる（改行はそのまま）
-    # 行ごとに処理して改行を保持する
-    lines = text.splitlines()
-    norm_lines = [re.sub(r" {2,}", " ", line) for line in lines]
-    # preserve trailing newline if present
-    return "\n".join(norm_lines) + ("\n" if text.endswith("\n") else "")
 
+def count_bytes(chunks: Iterable[bytes]) -> Counter:
+    # Counter はバイト列を C の速度で数える。キーは表示用に 1 文字の str に戻す
+    counts: Counter = Counter()
+    for chunk in chunks:
+        counts.update(chunk)
+    return Counter({chr(b): cnt for b, cnt in counts.items()})
 
-def char_list(text: str) -> list[str]:
-    # テキスト全体を正規化してから、有効な文字（A-Z, a-z, 半角スペース, 改行）を抽出
-    text = normalize_spaces(text)
-    return re.findall(r"[A-Za-z \n]", text)
+
+def fold_case(counter: Counter) -> Counter:
+    # 大文字の出現数を対応する小文字に足し込む。本文をもう一度走査する必要はない
+    ci: Counter = Counter()
+    for ch, cnt in counter.items():
+        ci[ch.lower()] += cnt
+    return ci
+
+
+def label_of(ch: str) -> str:
+    return LABELS.get(ch, ch)
 
 
 def print_table(counter: Counter, total: int, top: int, title: str) -> None:
-    print(title)
-    print(f"総文字数: {total}")
-    print("順位\t文字\t出現数\t割合")
-    for i, (ch, cnt) in enumerate(counter.most_common(top), start=1):
-        label = ch
-        if ch == "\n":
-            label = "\\n"
-        elif ch == " ":
-            label = "space"
-        print(f"{i}\t{label}\t{cnt}\t{cnt/total:.6f}")
+    lines = [title, f"総文字数: {total}", "順位\t文字\t出現数\t割合"]
+    lines += [
+        f"{i}\t{label_of(ch)}\t{cnt}\t{cnt/total:.6f}"
+        for i, (ch, cnt) in enumerate(counter.most_common(top), start=1)
+    ]
+    print("\n".join(lines))
 
 
 def save_csv(counter: Counter, total: int, path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["rank", "char", "count", "ratio"])
-        for i, (ch, cnt) in enumerate(counter.most_common(), start=1):
-            label = ch if ch != "\n" else "\\n"
-            if ch == " ":
-                label = "space"
-            w.writerow([i, label, cnt, f"{cnt/total:.6f}"])
+    save_freq_csv(counter, total, path, "char", label_of)
 
 
 def try_plot(counter: Counter, path: Path, top: int, title: str) -> None:
@@ -95,18 +85,13 @@ def try_show_gui(csv_paths: list[Path]) -> None:
         matplotlib.use("TkAgg")
         from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         import matplotlib.pyplot as plt
-        import pandas as pd
     except Exception as e:
         print(f"GUI 表示を行えません: {e}")
         print(
             "必要なパッケージが足りない可能性があります。Linux (Debian/Ubuntu) なら次を試してください:"
         )
-        print(
-            "  sudo apt update && sudo apt install -y python3-tk python3-matplotlib python3-pandas"
-        )
-        print(
-            "または pip によるインストール: python3 -m pip install --user matplotlib pandas"
-        )
+        print("  sudo apt update && sudo apt install -y python3-tk python3-matplotlib")
+        print("または pip によるインストール: python3 -m pip install --user matplotlib")
         return
 
     # 読み込み
@@ -114,11 +99,10 @@ def try_show_gui(csv_paths: list[Path]) -> None:
     titles = []
     for p in csv_paths:
         try:
-            df = pd.read_csv(p)
+            datas.append(read_csv_top(p, "char", 30))
         except Exception as e:
             print(f"CSV 読み込み失敗: {p} -> {e}")
             return
-        datas.append(df)
         titles.append(p.stem)
 
     # Tk ウィンドウ
@@ -136,10 +120,7 @@ def try_show_gui(csv_paths: list[Path]) -> None:
     fig, axes = plt.subplots(1, n, figsize=(5 * n, 5))
     if n == 1:
         axes = [axes]
-    for ax, df, title in zip(axes, datas, titles):
-        top_n = df.head(30)
-        labels = top_n["char"].astype(str).tolist()
-        counts = top_n["count"].tolist()
+    for ax, (labels, counts), title in zip(axes, datas, titles):
         ax.bar(labels, counts)
         ax.set_title(title)
         ax.tick_params(axis="x", rotation=45)
@@ -167,7 +148,7 @@ def try_show_gui(csv_paths: list[Path]) -> None:
     root.mainloop()
 
 
-def main():
+def main(argv: list[str] | None = None):
     p = argparse.ArgumentParser()
     p.add_argument("--src", default="examples/processed")
     p.add_argument("--top", type=int, default=50)
@@ -182,23 +163,20 @@ def main():
         default="/home/leo0607y/work/numerical_analysis/Output/process2",
         help="CSV 出力先ディレクトリ",
     )
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     src = Path(args.src)
     if not src.is_dir():
         print(f"ソースディレクトリが見つかりません: {src}")
         return 2
 
-    text = read_all_texts(src)
-    chars = char_list(text)
-    if not chars:
+    cs = count_bytes(iter_filtered(src))
+    total = sum(cs.values())
+    if not total:
         print(f"処理済みファイルが見つからないか文字が抽出できません: {src}")
         return 2
 
-    total = len(chars)
-    cs = Counter(chars)
-    lower_chars = [c.lower() if c != "\n" and c != " " else c for c in chars]
-    ci = Counter(lower_chars)
+    ci = fold_case(cs)
     print_table(cs, total, args.top, "文字出現率（大文字小文字を区別）")
     print()
     print_table(ci, total, args.top, "文字出現率（大文字小文字を区別しない）")
@@ -6,40 +6,46 @@ from __future__ import annotations
 import argparse
 from collections import Counter
 from pathlib import Path
-import re
-import csv
-import sys
+from typing import Iterable
+import string
 
+from ..common.analysis import iter_filtered, read_csv_top, save_freq_csv
 
-def read_all_texts(src_dir: Path) -> str:
-    parts = []
-    for p in sorted(src_dir.glob("*_processed.txt")):
-        parts.append(p.read_text(encoding="utf-8", errors="replace"))
-    return "".join(parts)
 
+LOWER_TABLE = bytes.maketrans(
+    string.ascii_uppercase.encode("ascii"), string.ascii_lowercase.encode("ascii")
+)
 
-def normalize_spaces(text: str) -> str:
-    lines = text.splitlines()
-    norm_lines = [re.sub(r" {2,}", " ", line) for line in lines]
-    return "\n".join(norm_lines) + ("\n" if text.endswith("\n") else "")
 
+def decode_ngrams(counts: Counter) -> Counter:
+    # 文字列に戻すのは種類数（高々 54**n）だけ
+    return Counter({bytes(ng).decode("ascii"): cnt for ng, cnt in counts.items()})
 
-def char_list(text: str) -> list[str]:
-    text = normalize_spaces(text)
-    return re.findall(r"[A-Za-z \n]", text)
 
-
-def ngrams_from_chars(chars: list[str], n: int) -> list[str]:
-    return ["".join(chars[i : i + n]) for i in range(len(chars) - n + 1)]
+def count_bigrams_trigrams(chunks: Iterable[bytes]) -> tuple[Counter, Counter, int]:
+    # 3 つずらしたビューを zip で束ね、三ッ組ごとの文字列を作らずに C の速度で数える。
+    # ファイルごとに数え、前のファイルの末尾 2 文字を引き継いで境界をまたぐ組も数える
+    tri: Counter = Counter()
+    carry = b""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        buf = carry + chunk
+        view = memoryview(buf)
+        tri.update(zip(view, view[1:], view[2:]))
+        carry = buf[-2:]
+    # 二ッ組は位置 i の三ッ組の先頭 2 文字と、末尾の二ッ組 1 つで尽くされるので、
+    # 本文をもう一度走査せず三ッ組の集計から求める（種類数ぶんのループで済む）
+    bi: Counter = Counter()
+    for (a, b, _), cnt in tri.items():
+        bi[a, b] += cnt
+    if len(carry) == 2:
+        bi[carry[0], carry[1]] += 1
+    return decode_ngrams(bi), decode_ngrams(tri), total
 
 
 def save_ngram_csv(counter: Counter, total: int, path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["rank", "ngram", "count", "ratio"])
-        for i, (ng, cnt) in enumerate(counter.most_common(), start=1):
-            w.writerow([i, ng, cnt, f"{cnt/total:.6f}"])
+    save_freq_csv(counter, total, path, "ngram")
 
 
 def try_show_gui(bigram_csv: Path, trigram_csv: Path, top: int | None) -> None:
@@ -50,34 +56,22 @@ def try_show_gui(bigram_csv: Path, trigram_csv: Path, top: int | None) -> None:
         matplotlib.use("TkAgg")
         from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         import matplotlib.pyplot as plt
-        import pandas as pd
     except Exception as e:
         print(f"GUI 表示を行えません: {e}")
         print(
             "必要なパッケージが足りない可能性があります。Linux (Debian/Ubuntu) なら次を試してください:"
         )
-        print(
-            "  sudo apt update && sudo apt install -y python3-tk python3-matplotlib python3-pandas"
-        )
-        print(
-            "または pip によるインストール: python3 -m pip install --user matplotlib pandas"
-        )
+        print("  sudo apt update && sudo apt install -y python3-tk python3-matplotlib")
+        print("または pip によるインストール: python3 -m pip install --user matplotlib")
         return
 
     try:
-        bg = pd.read_csv(bigram_csv)
-        tg = pd.read_csv(trigram_csv)
+        bgp = read_csv_top(bigram_csv, "ngram", top or None)
+        tgp = read_csv_top(trigram_csv, "ngram", top or None)
     except Exception as e:
         print(f"CSV 読み込みに失敗しました: {e}")
         return
 
-    if top:
-        bgp = bg.head(top)
-        tgp = tg.head(top)
-    else:
-        bgp = bg
-        tgp = tg
-
     try:
         root = tk.Tk()
     except Exception as e:
@@ -89,8 +83,8 @@ def try_show_gui(bigram_csv: Path, trigram_csv: Path, top: int | None) -> None:
     scr_w = root.winfo_screenwidth()
     scr_h = root.winfo_screenheight()
 
-    n1 = len(bgp)
-    n2 = len(tgp)
+    n1 = len(bgp[0])
+    n2 = len(tgp[0])
     bar_px = 12
     desired_width_px = max(800, int(max(n1, n2) * bar_px))
     max_width_px = int(scr_w * 0.9)
@@ -104,10 +98,9 @@ def try_show_gui(bigram_csv: Path, trigram_csv: Path, top: int | None) -> None:
 
     fig, axes = plt.subplots(2, 1, figsize=(fig_w, fig_h), constrained_layout=True)
 
-    def plot_axis(ax, df, title):
-        raw_labels = df["ngram"].astype(str).tolist()
+    def plot_axis(ax, data, title):
+        raw_labels, counts = data
         labels = [s.replace(" ", "□") for s in raw_labels]
-        counts = df["count"].tolist()
         ax.bar(labels, counts)
         ax.set_title(title)
         if len(labels) > 20:
@@ -138,7 +131,7 @@ def try_show_gui(bigram_csv: Path, trigram_csv: Path, top: int | None) -> None:
     root.mainloop()
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(description="二ッ組・三ッ組解析を行い CSV を出力します")
     p.add_argument(
         "--src", default="examples/processed", help="処理済みテキストのディレクトリ"
@@ -158,30 +151,22 @@ def main() -> int:
         help="出力先ディレクトリ",
     )
     p.add_argument("--gui", action="store_true", help="GUI を表示する（Tk が必要）")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     src = Path(args.src)
     if not src.is_dir():
         print(f"ソースディレクトリが見つかりません: {src}")
         return 2
 
-    text = read_all_texts(src)
-    chars = char_list(text)
-    if not chars:
-        print(f"処理済みファイルが見つからないか文字が抽出できません: {src}")
-        return 2
-
+    chunks = iter_filtered(src)
     # case-insensitive by default
     if not args.case_sensitive:
-        proc_chars = [c.lower() if c != "\n" and c != " " else c for c in chars]
-    else:
-        proc_chars = chars
+        chunks = (chunk.translate(LOWER_TABLE) for chunk in chunks)
 
-    bigrams = ngrams_from_chars(proc_chars, 2)
-    trigrams = ngrams_from_chars(proc_chars, 3)
-
-    cb = Counter(bigrams)
-    ct = Counter(trigrams)
+    cb, ct, total = count_bigrams_trigrams(chunks)
+    if not total:
+        print(f"処理済みファイルが見つからないか文字が抽出できません: {src}")
+        return 2
 
     outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
@@ -5,65 +5,81 @@
 from __future__ import annotations
 import argparse
 import csv
+from array import array
+import mmap
 import random
+import shutil
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
+from ..common.alias import build_alias, sample_alias
 
-def read_distribution_from_csv(path: Path) -> Tuple[List[str], List[int]]:
+
+def read_distribution_from_csv(path: Path) -> Tuple[List[str], Sequence[int]]:
     chars: List[str] = []
-    counts: List[int] = []
-    with path.open("r", encoding="utf-8") as f:
-        r = csv.DictReader(f)
+    # 出現数は int64 の配列で持つ
+    counts = array("q")
+    with path.open("r", encoding="utf-8", newline="") as f:
+        r = csv.reader(f)
         # Expect columns: rank,char,count,ratio
+        header = next(r, [])
+        if "char" not in header:
+            return chars, counts
+        ci_char = header.index("char")
+        ci_count = header.index("count") if "count" in header else None
         for row in r:
-            ch = row.get("char")
-            if ch is None:
+            if len(row) <= ci_char:
                 continue
+            ch = row[ci_char]
             # normalize special labels used in CSV: literal '\\n' -> newline, 'space' -> actual space
             if ch == "\\n":
                 ch = "\n"
             elif ch == "space":
                 ch = " "
             chars.append(ch)
-            cnt = row.get("count")
             try:
-                counts.append(int(cnt))
+                counts.append(int(row[ci_count]))
             except Exception:
                 counts.append(0)
     return chars, counts
 
 
-def generate_by_distribution(chars: List[str], counts: List[int], n: int) -> List[str]:
-    # random.choices supports weights
-    if not chars or not counts:
-        return []
-    return random.choices(chars, weights=counts, k=n)
+def generate_by_distribution(
+    chars: List[str], counts: Sequence[int], n: int, rng: random.Random
+) -> List[str]:
+    # 1 回の抽選は O(1) のエイリアス法で行う
+    prob, alias = build_alias(counts)
+    return sample_alias(chars, prob, alias, n, rng)
 
 
-def generate_by_text(src_dir: Path, n: int) -> List[str]:
-    parts: List[str] = []
+def concat_processed(src_dir: Path, dst) -> int:
+    # 処理済みファイルを 1 MiB ずつ dst に流し込む（全体を文字列として結合しない）
     for p in sorted(src_dir.glob("*_processed.txt")):
-        parts.append(p.read_text(encoding="utf-8", errors="replace"))
-    full = "".join(parts)
-    if not full:
-        return []
-    M = len(full)
-    out: List[str] = []
-    for _ in range(n):
-        k = random.randint(1, M)
-        out.append(full[k - 1])
-    return out
+        with p.open("rb") as src:
+            shutil.copyfileobj(src, dst, length=1 << 20)
+    return dst.tell()
+
+
+def sample_bytes(buf, n: int, rng: random.Random) -> List[str]:
+    # 簡便法の「M 以下の任意の k 番目の文字」を 1 回の choices で n 回分まとめて引き、
+    # 選ばれたバイトを 1 度だけデコードする。処理済みテキストは ASCII のみなので
+    # 1 バイト = 1 文字として扱える
+    picks = bytes(rng.choices(buf, k=n))
+    return list(picks.decode("utf-8", errors="replace"))
+
+
+def generate_by_alltext(path: Path, n: int, rng: random.Random) -> List[str]:
+    # ALL_TEXT.txt はメモリマップし、全体を読み込まずに選ばれた位置のバイトだけを参照する
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return sample_bytes(mm, n, rng)
 
 
 def render_list(lst: List[str], one_per_line: bool) -> str:
-    if one_per_line:
-        return "\n".join(c for c in lst)
-    else:
-        return "".join(lst)
+    # どちらも C の join 1 回で済ませる（要素ごとのジェネレータを挟まない）
+    return "\n".join(lst) if one_per_line else "".join(lst)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(
         description="手順4: 文字分布に従ってランダム文字を生成します"
     )
@@ -89,6 +105,7 @@ def main() -> int:
         help="ALL_TEXT.txt のパス (text モードで優先的に使用)",
     )
     p.add_argument("--n", type=int, default=100, help="生成する文字数")
+    p.add_argument("--seed", type=int, default=None, help="乱数シード")
     p.add_argument(
         "--out", default=None, help="生成結果の出力先ファイル (省略で標準出力)"
     )
@@ -98,7 +115,10 @@ def main() -> int:
         action="store_true",
         help="インライン出力時に改行文字を削除して横並びにする（--lines と併用しないこと）",
     )
-    args = p.parse_args()
+    args = p.parse_args(argv)
+
+    # このスクリプト専用の乱数生成器
+    rng = random.Random(args.seed)
 
     if args.mode == "dist":
         csvp = Path(args.csv)
@@ -106,7 +126,7 @@ def main() -> int:
             print(f"CSV ファイルが見つかりません: {csvp}")
             return 2
         chars, counts = read_distribution_from_csv(csvp)
-        out = generate_by_distribution(chars, counts, args.n)
+        out = generate_by_distribution(chars, counts, args.n, rng)
     else:
         allp = Path(args.alltext)
         src = Path(args.src)
@@ -115,35 +135,26 @@ def main() -> int:
             if not src.is_dir():
                 print(f"処理済みディレクトリが見つかりません: {src}")
                 return 2
-            parts: list[str] = []
-            for p in sorted(src.glob("*_processed.txt")):
-                parts.append(p.read_text(encoding="utf-8", errors="replace"))
-            full = "".join(parts)
-            allp.write_text(full, encoding="utf-8")
-            print(f"作成: {allp} (結合済みテキスト) 文字数={len(full)}")
-
-        alltxt = allp.read_text(encoding="utf-8", errors="replace")
-        if not alltxt:
+            with allp.open("wb") as dst:
+                size = concat_processed(src, dst)
+            print(f"作成: {allp} (結合済みテキスト) バイト数={size}")
+
+        if allp.stat().st_size == 0:
             print(f"ALL_TEXT.txt が空です: {allp}")
             return 2
-        M = len(alltxt)
-        out_list: list[str] = []
-        for _ in range(args.n):
-            k = random.randint(1, M)
-            out_list.append(alltxt[k - 1])
-        out = out_list
+        out = generate_by_alltext(allp, args.n, rng)
 
     # 出力: 引用符や repr を使わずそのまま表示する
     if args.lines:
         # 1 行に 1 文字ずつ（改行文字は空行となる）
         if args.out:
-            Path(args.out).write_text("\n".join(out), encoding="utf-8")
+            Path(args.out).write_text(render_list(out, True), encoding="utf-8")
             print(f"生成結果を保存しました: {args.out}")
         else:
-            for c in out:
-                print(c, end="\n")
+            # 1 文字ずつ print せず、まとめて 1 回で書き出す
+            print(render_list(out, True))
     else:
-        joined = "".join(out)
+        joined = render_list(out, False)
         # --no-newline が指定されていれば改行文字を削除して横並びにする
         if getattr(args, "no_newline", False):
             joined = joined.replace("\n", "")
@@ -6,10 +6,14 @@ from __future__ import annotations
 import argparse
 import random
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
+from ..common.ngram_args import add_ngram_args, ngram_outputs
 
-def generate_by_ngram_alltext(alltext: str, ngram: int, length: int) -> str:
+
+def generate_by_ngram_alltext(
+    alltext: str, ngram: int, length: int, rng: random.Random
+) -> str:
     """
     Generate a string of requested length using the simplified n-gram method described.
 
@@ -17,7 +21,7 @@ def generate_by_ngram_alltext(alltext: str, ngram: int, length: int) -> str:
       - pick random k with k+1 < M, output alltext[k:k+2], set A = alltext[k+1]
       - repeat: pick random k', search from k' for first occurrence of A where i+1 < M,
         if found append alltext[i+1] to output and set A = alltext[i+1]
-        otherwise retry a limited number of times and fallback to random adjacent char
+        otherwise fallback to random adjacent char
 
     For trigram (ngram=3): similar but A is last (n-1) characters and we search for A
     occurrences and take the following character.
@@ -34,44 +38,48 @@ def generate_by_ngram_alltext(alltext: str, ngram: int, length: int) -> str:
     max_k = M - (ngram - 1)
     if max_k <= 0:
         return ""
-    k = random.randint(0, max_k - 1)
+    k = rng.randint(0, max_k - 1)
     out_chars = list(alltext[k : k + ngram])
 
-    # the 'context' A is last n-1 chars
-    A = "".join(out_chars[-(ngram - 1) :])
+    # the 'context' A is last n-1 chars（出力リストからではなく本文から直接取る）
+    c = ngram - 1
+    A = alltext[k + 1 : k + ngram]
+
+    # 後ろに 1 文字続く出現だけが有効なので、検索範囲は alltext[:M-1] に限る
+    end = M - 1
+    # 文脈ごとの最初と最後の有効な出現位置を覚えておく。k' が最後の出現より後ろなら
+    # 末尾まで探して先頭から探し直す 2 回の全文走査をせず、最初の出現をそのまま使える
+    bounds: Dict[str, Tuple[int, int]] = {}
 
     # generate until reaching desired length
     while len(out_chars) < length:
         # pick random start
-        start = random.randint(0, M - 1)
-        found = -1
-        # try searching from start to end
-        idx = alltext.find(A, start)
-        if idx != -1 and idx + (ngram - 1) < M:
-            found = idx
+        start = rng.randint(0, M - 1)
+        b = bounds.get(A)
+        if b is None:
+            b = bounds[A] = (alltext.find(A, 0, end), alltext.rfind(A, 0, end))
+        first, last = b
+        if first == -1 or start > last:
+            # 見つからなければ先頭からの最初の出現に戻る (wrap)
+            found = first
         else:
-            # try from beginning to start (wrap)
-            idx = alltext.find(A, 0)
-            if idx != -1 and idx + (ngram - 1) < M:
-                found = idx
+            found = alltext.find(A, start, end)
 
         if found != -1:
             # append the character following the matched context
-            next_pos = found + (ngram - 1)
-            next_char = alltext[next_pos]
-            out_chars.append(next_char)
-            A = (A + next_char)[-(ngram - 1) :]
+            next_char = alltext[found + c]
         else:
             # fallback: pick random position with room and append next char
-            fk = random.randint(0, M - ngram)
-            next_char = alltext[fk + ngram - 1]
-            out_chars.append(next_char)
-            A = (A + next_char)[-(ngram - 1) :]
+            fk = rng.randint(0, M - ngram)
+            next_char = alltext[fk + c]
+        out_chars.append(next_char)
+        # 文脈は先頭の 1 文字を落として next_char を足す（二ッ組なら next_char そのもの）
+        A = A[1:] + next_char
 
     return "".join(out_chars[:length])
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(
         description="手順5: 二ッ組/三ッ組出現率に従った簡便なランダム文字列生成"
     )
@@ -84,18 +92,21 @@ def main() -> int:
     p.add_argument(
         "--alltext", default="ALL_TEXT.txt", help="結合済みテキスト ALL_TEXT.txt のパス"
     )
+    p.add_argument("--seed", type=int, default=None, help="乱数シード（再現性のため）")
     p.add_argument("--out", default=None, help="出力先ファイル（省略時は標準出力）")
+    add_ngram_args(p)
     p.add_argument(
         "--no-newline",
         action="store_true",
         help="出力時に改行文字を削除して横並びにする",
     )
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    targets = ngram_outputs(p, args)
 
     allp = Path(args.alltext)
     if not allp.exists():
         print(
-            f"ALL_TEXT.txt が見つかりません: {allp} — 先に scripts/process4/build_all_text.py で作成してください"
+            f"ALL_TEXT.txt が見つかりません: {allp} — 先に python3 -m scripts.process4.build_all_text で作成してください"
         )
         return 2
 
@@ -104,15 +115,18 @@ def main() -> int:
         print(f"ALL_TEXT.txt が空です: {allp}")
         return 2
 
-    result = generate_by_ngram_alltext(alltxt, args.ngram, args.length)
-    if args.no_newline:
-        result = result.replace("\n", "")
+    for n, out in targets:
+        result = generate_by_ngram_alltext(
+            alltxt, n, args.length, random.Random(args.seed)
+        )
+        if args.no_newline:
+            result = result.replace("\n", "")
 
-    if args.out:
-        Path(args.out).write_text(result, encoding="utf-8")
-        print(f"生成結果を保存しました: {args.out}")
-    else:
-        print(result)
+        if out:
+            Path(out).write_text(result, encoding="utf-8")
+            print(f"生成結果を保存しました: {out}")
+        else:
+            print(result)
 
     return 0
 
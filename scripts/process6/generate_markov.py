@@ -4,56 +4,75 @@
 # Contact: reo.yamaguchi0607@gmail.com
 from __future__ import annotations
 import argparse
+import bisect
+import itertools
 import random
-from collections import defaultdict
+from collections import Counter
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
+from ..common.ngram_args import add_ngram_args, ngram_outputs
 
-def build_followers(alltext: str, n: int) -> Dict[str, List[str]]:
-    """Build a mapping (n-1)-gram -> list of following characters (with repetition).
 
-    Example: n=2 (bigram) -> keys are single chars, values are list of following chars.
+Followers = Dict[str, Tuple[str, List[int]]]
+
+
+def build_followers(alltext: str, n: int) -> Followers:
+    """Build a mapping (n-1)-gram -> (following characters, cumulative counts).
+
+    Example: n=2 (bigram) -> keys are single chars, values hold each distinct
+    following char once together with the running total of its count.
     """
     M = len(alltext)
-    followers: Dict[str, List[str]] = defaultdict(list)
+    followers: Followers = {}
     if M < n:
         return followers
-    for i in range(M - n + 1):
-        key = alltext[i : i + n - 1]
-        follow = alltext[i + n - 1]
-        followers[key].append(follow)
+    # ずらした文字列を zip で束ねて Counter に渡し、n-gram の数え上げを C の速度で行う。
+    # 位置ごとに部分文字列やリストの要素を作らず、辞書は種類数ぶんの大きさで済む
+    grams = Counter(zip(*(alltext[j:] for j in range(n))))
+    groups: Dict[str, Tuple[List[str], List[int]]] = {}
+    for gram, cnt in grams.items():
+        chars, cum = groups.setdefault("".join(gram[:-1]), ([], []))
+        chars.append(gram[-1])
+        cum.append(cum[-1] + cnt if cum else cnt)
+    for key, (chars, cum) in groups.items():
+        followers[key] = ("".join(chars), cum)
     return followers
 
 
-def generate_markov(alltext: str, n: int, length: int, seed: int | None = None) -> str:
-    if seed is not None:
-        random.seed(seed)
-
+def generate_markov(alltext: str, n: int, length: int, rng: random.Random) -> str:
     followers = build_followers(alltext, n)
     keys = list(followers.keys())
     if not keys:
         return ""
 
+    # フォールバックでは各キーをその出現数に比例して選ぶ（一様ではなく本来の分布に従う）
+    key_cum = list(itertools.accumulate(cum[-1] for _, cum in followers.values()))
+
     # pick initial key randomly
-    key = random.choice(keys)
+    key = rng.choice(keys)
     out = list(key)
 
+    # ループ内で使う関数はローカル変数に束縛し、属性参照を省く
+    rnd = rng.random
+    bis = bisect.bisect
     while len(out) < length:
-        if key in followers and followers[key]:
-            next_char = random.choice(followers[key])
-        else:
-            # fallback: pick random key and take one of its followers if available
-            fk = random.choice(keys)
-            next_char = random.choice(followers.get(fk, [" "]))
+        follow = followers.get(key)
+        if follow is None:
+            # fallback: pick a key by its frequency and take one of its followers
+            follow = followers[keys[bis(key_cum, rnd() * key_cum[-1])]]
+        # 累積出現数の上を二分探索して次の文字を選ぶ（random.choices と同じ抽選）
+        chars, cum = follow
+        next_char = chars[bis(cum, rnd() * cum[-1])]
         out.append(next_char)
-        # update key to last n-1 chars
-        key = "".join(out[-(n - 1) :])
+        # 直前の n-1 文字は、キーの先頭を 1 文字落として next_char を足せば得られる
+        # （出力リストを毎回スライスして join し直さない）
+        key = key[1:] + next_char
 
     return "".join(out[:length])
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(
         description="手順6: (n-1)-gram->followers 辞書を使った高速生成 (Markov 風)"
     )
@@ -64,17 +83,19 @@ def main() -> int:
     p.add_argument("--alltext", default="ALL_TEXT.txt", help="結合済みテキストのパス")
     p.add_argument("--seed", type=int, default=None, help="乱数シード（再現性のため）")
     p.add_argument("--out", default=None, help="出力ファイル（省略で stdout）")
+    add_ngram_args(p)
     p.add_argument(
         "--no-newline",
         action="store_true",
         help="出力時に改行文字を削除して横並びにする",
     )
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    targets = ngram_outputs(p, args)
 
     allp = Path(args.alltext)
     if not allp.exists():
         print(
-            f"ALL_TEXT.txt が見つかりません: {allp} — 先に scripts/process4/build_all_text.py で作成してください"
+            f"ALL_TEXT.txt が見つかりません: {allp} — 先に python3 -m scripts.process4.build_all_text で作成してください"
         )
         return 2
 
@@ -83,15 +104,16 @@ def main() -> int:
         print(f"ALL_TEXT.txt が空です: {allp}")
         return 2
 
-    result = generate_markov(alltxt, args.ngram, args.length, args.seed)
-    if args.no_newline:
-        result = result.replace("\n", "")
+    for n, out in targets:
+        result = generate_markov(alltxt, n, args.length, random.Random(args.seed))
+        if args.no_newline:
+            result = result.replace("\n", "")
 
-    if args.out:
-        Path(args.out).write_text(result, encoding="utf-8")
-        print(f"生成結果を保存しました: {args.out}")
-    else:
-        print(result)
+        if out:
+            Path(out).write_text(result, encoding="utf-8")
+            print(f"生成結果を保存しました: {out}")
+        else:
+            print(result)
 
     return 0
 
@@ -7,48 +7,72 @@ ALL_TEXT.txtから全単語・全2語/3語フレーズの頻度ランキング
 """
 from __future__ import annotations
 import argparse
+import mmap
+import os
 import re
 import csv
 from pathlib import Path
 from collections import Counter
 
+WORD_SPLIT = re.compile(r"\b\w+\b|[.,!?;:\-']")
+# ASCII のみのテキスト用のバイト列版（bytes の \w は ASCII の英数字と _ に一致する）
+WORD_SPLIT_BYTES = re.compile(rb"\b\w+\b|[.,!?;:\-']")
+RE_NON_ASCII = re.compile(rb"[\x80-\xff]")
+
 
 def tokenize(text: str) -> list[str]:
     # 単語・記号単位で分割
-    return re.findall(r"\b\w+\b|[.,!?;:\-']", text)
+    return WORD_SPLIT.findall(text)
+
 
+def read_words(path: Path) -> list[bytes]:
+    """ファイルを str にデコードせず、メモリマップ上で直接単語に分割する。
 
-def ngrams(words: list[str], n: int) -> list[tuple[str, ...]]:
-    return [tuple(words[i : i + n]) for i in range(len(words) - n + 1)]
+    単語は UTF-8 のバイト列で返し、文字列に戻すのは CSV に書く種類ぶんだけにする。
+    ASCII 以外を含むファイルは \w の意味が変わるので、従来どおりデコードしてから分割する。
+    """
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if RE_NON_ASCII.search(mm) is None:
+                return WORD_SPLIT_BYTES.findall(mm)
+            text = mm[:].decode("utf-8", errors="replace")
+    return [w.encode("utf-8") for w in tokenize(text)]
 
 
-def save_csv(counter: Counter, path: Path, label: str = "ngram"):
+def save_csv(
+    counter: Counter, path: Path, label: str = "ngram", top: int | None = None
+):
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("w", encoding="utf-8", newline="") as f:
         w = csv.writer(f)
         w.writerow(["rank", label, "count", "ratio"])
+        # 割合は上位に絞る前の総数に対して求める
         total = sum(counter.values())
-        for i, (ng, cnt) in enumerate(counter.most_common(), start=1):
-            ng_str = " ".join(ng) if isinstance(ng, tuple) else ng
-            w.writerow([i, ng_str, cnt, f"{cnt/total:.8f}"])
+        # top 指定時は most_common(top) がヒープで上位だけを選ぶので、全件を並べ替えずに済む
+        for i, (ng, cnt) in enumerate(counter.most_common(top), start=1):
+            ng_bytes = b" ".join(ng) if isinstance(ng, tuple) else ng
+            w.writerow([i, ng_bytes.decode("utf-8"), cnt, f"{cnt/total:.8f}"])
 
 
-def main():
+def main(argv: list[str] | None = None):
     p = argparse.ArgumentParser(
         description="ALL_TEXT.txtから全単語・全2語/3語フレーズ頻度CSV出力"
     )
     p.add_argument("--alltext", default="ALL_TEXT.txt", help="学習用テキスト")
     p.add_argument("--outdir", default="Output/process7", help="出力ディレクトリ")
-    args = p.parse_args()
+    p.add_argument(
+        "--top", type=int, default=None, help="CSV に書く上位 N 件（省略で全て）"
+    )
+    args = p.parse_args(argv)
 
     allp = Path(args.alltext)
     if not allp.exists():
         print(f"ALL_TEXT.txt が見つかりません: {allp}")
         return 2
-    text = allp.read_text(encoding="utf-8", errors="replace")
-    words = []
-    for line in text.splitlines():
-        words.extend(tokenize(line))
+    # 単語は改行をまたがないので、行に分けずに全文を一度に分割する
+    words = read_words(allp)
     if not words:
         print("単語が抽出できません")
         return 2
@@ -56,13 +80,13 @@ def main():
     outdir.mkdir(parents=True, exist_ok=True)
     # 単語頻度
     wc = Counter(words)
-    save_csv(wc, outdir / "word_freq.csv", label="word")
-    # 2語フレーズ
-    bg = Counter(ngrams(words, 2))
-    save_csv(bg, outdir / "bigram_freq.csv", label="bigram")
+    save_csv(wc, outdir / "word_freq.csv", label="word", top=args.top)
+    # 2語フレーズ（ずらしたリストを zip で束ね、組を直接 Counter に渡す）
+    bg = Counter(zip(words, words[1:]))
+    save_csv(bg, outdir / "bigram_freq.csv", label="bigram", top=args.top)
     # 3語フレーズ
-    tg = Counter(ngrams(words, 3))
-    save_csv(tg, outdir / "trigram_freq.csv", label="trigram")
+    tg = Counter(zip(words, words[1:], words[2:]))
+    save_csv(tg, outdir / "trigram_freq.csv", label="trigram", top=args.top)
     print(f"保存: {outdir}/word_freq.csv, bigram_freq.csv, trigram_freq.csv")
     return 0
 
@@ -8,41 +8,56 @@
 from __future__ import annotations
 import argparse
 import csv
+from array import array
 import random
 from pathlib import Path
-from typing import List
+from typing import List, Sequence
 
+from ..common.alias import build_alias, sample_alias
 
-def read_freq_csv(path: Path) -> tuple[List[str], List[int]]:
-    items = []
-    counts = []
-    with path.open("r", encoding="utf-8") as f:
-        r = csv.DictReader(f)
+
+# CSV の種類ごとの項目列の名前（先に見つかった列を使う）
+ITEM_COLUMNS = ("word", "bigram", "trigram", "ngram")
+
+
+def read_freq_csv(path: Path) -> tuple[List[str], Sequence[int]]:
+    items: List[str] = []
+    counts = array("q")
+    with path.open("r", encoding="utf-8", newline="") as f:
+        r = csv.reader(f)
+        header = next(r, [])
+        ci_item = next((header.index(c) for c in ITEM_COLUMNS if c in header), None)
+        if ci_item is None:
+            return items, counts
+        ci_count = header.index("count") if "count" in header else None
         for row in r:
-            item = (
-                row.get("word")
-                or row.get("bigram")
-                or row.get("trigram")
-                or row.get("ngram")
-            )
-            if item is None:
+            if len(row) <= ci_item or not row[ci_item]:
                 continue
-            cnt = row.get("count")
             try:
-                counts.append(int(cnt))
+                counts.append(int(row[ci_count]))
             except Exception:
                 counts.append(0)
-            items.append(item)
+            items.append(row[ci_item])
     return items, counts
 
 
-def generate_by_distribution(items: List[str], counts: List[int], n: int) -> List[str]:
+# 語彙がこれより少なければ random.choices の二分探索でも十分速い
+ALIAS_MIN_ITEMS = 64
+
+
+def generate_by_distribution(
+    items: List[str], counts: Sequence[int], n: int, rng: random.Random
+) -> List[str]:
     if not items or not counts:
         return []
-    return random.choices(items, weights=counts, k=n)
+    if len(items) < ALIAS_MIN_ITEMS:
+        return rng.choices(items, weights=counts, k=n)
+    # 単語 n-gram の CSV は行数が多いので、1 回の抽選を二分探索ではなく O(1) で行う
+    prob, alias = build_alias(counts)
+    return sample_alias(items, prob, alias, n, rng)
 
 
-def main():
+def main(argv: list[str] | None = None):
     p = argparse.ArgumentParser(description="単語/2語/3語フレーズ分布からランダム生成")
     p.add_argument(
         "--csv",
@@ -53,16 +68,15 @@ def main():
     p.add_argument("--out", default=None, help="出力ファイル (省略で標準出力)")
     p.add_argument("--lines", action="store_true", help="1行に1件ずつ出力")
     p.add_argument("--seed", type=int, default=None, help="乱数シード")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
-    if args.seed is not None:
-        random.seed(args.seed)
+    rng = random.Random(args.seed)
     csvp = Path(args.csv)
     if not csvp.exists():
         print(f"CSVファイルが見つかりません: {csvp}")
         return 2
     items, counts = read_freq_csv(csvp)
-    out_list = generate_by_distribution(items, counts, args.n)
+    out_list = generate_by_distribution(items, counts, args.n, rng)
     if args.lines:
         out_text = "\n".join(out_list)
     else:
@@ -7,10 +7,12 @@ STEP7: 単語単位のMarkovモデルによる英文生成＋コナン・ドイ
 """
 from __future__ import annotations
 import argparse
+import bisect
 import random
 import re
+import sys
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import Counter
 
 # コナン・ドイルらしさ語彙・フレーズ例
 DOYLE_WORDS = [
@@ -50,10 +52,14 @@ DOYLE_PHRASES = [
     "Holmes remarked",
     "The client arrived",
 ]
+# 所属判定用（リストの線形探索ではなくハッシュで引く）
+DOYLE_WORD_SET = frozenset(DOYLE_WORDS)
 
 # 英文の区切り（簡易）
 SENTENCE_END = re.compile(r"[.!?]")
 WORD_SPLIT = re.compile(r"\b\w+\b|[.,!?;:\-']")
+# 句読点の前の空白（1 回の走査でまとめて取り除く）
+_PUNCT_FIX = re.compile(r" ([.,!?])")
 
 
 def tokenize(text: str) -> list[str]:
@@ -62,47 +68,72 @@ def tokenize(text: str) -> list[str]:
 
 
 def build_markov(words: list[str], n: int = 2) -> dict:
-    # (n-1)-gram -> 次の単語リスト
-    markov = defaultdict(list)
-    for i in range(len(words) - n):
-        key = tuple(words[i : i + n - 1])
-        next_word = words[i + n - 1]
-        markov[key].append(next_word)
-    return markov
-
-
-def generate_sentence(markov: dict, length: int = 20, seed: int | None = None) -> str:
-    if seed is not None:
-        random.seed(seed)
-    keys = list(markov.keys())
+    """(n-1)-gram -> (次の単語, 累積出現数, らしさ語彙の次の単語, その累積出現数)。
+
+    次の単語は種類ごとに 1 つだけ持ち、出現数の累積で重みを表す。
+    らしさ語彙に絞った候補もここで一度だけ作っておく。
+    """
+    # 元の実装どおり、最後の単語で終わる n-gram は数えない
+    body = words[:-1]
+    grams = Counter(zip(*(body[j:] for j in range(n))))
+    groups: dict = {}
+    for gram, cnt in grams.items():
+        nexts, cum, doyle_nexts, doyle_cum = groups.setdefault(
+            gram[:-1], ([], [], [], [])
+        )
+        w = gram[-1]
+        nexts.append(w)
+        cum.append(cum[-1] + cnt if cum else cnt)
+        if w in DOYLE_WORD_SET:
+            doyle_nexts.append(w)
+            doyle_cum.append(doyle_cum[-1] + cnt if doyle_cum else cnt)
+    return groups
+
+
+def find_start_candidates(markov: dict) -> list[tuple[str, ...]]:
+    # コナン・ドイル語彙を含むキー。モデルが同じなら何文生成しても変わらない
+    return [k for k in markov if any(w in DOYLE_WORD_SET for w in k)]
+
+
+def generate_sentence(
+    markov: dict,
+    rng: random.Random,
+    length: int = 20,
+    start_candidates: list[tuple[str, ...]] | None = None,
+) -> str:
     # コナン・ドイル語彙・フレーズを優先的に開始語に
-    start_candidates = [k for k in keys if any(w in DOYLE_WORDS for w in k)]
-    key = random.choice(start_candidates) if start_candidates else random.choice(keys)
+    if start_candidates is None:
+        start_candidates = find_start_candidates(markov)
+    key = (
+        rng.choice(start_candidates)
+        if start_candidates
+        else rng.choice(list(markov.keys()))
+    )
     out = list(key)
+    # 直前の n-1 語のタプルは出力リストから作り直さず、1 語ずつずらして更新する
+    ctx = key
+    rnd = rng.random
+    bis = bisect.bisect
     for _ in range(length - len(key)):
-        nexts = markov.get(tuple(out[-(len(key)) :]), [])
-        # らしさ語彙・フレーズを優先
-        doyle_nexts = [w for w in nexts if w in DOYLE_WORDS]
-        if doyle_nexts:
-            next_word = random.choice(doyle_nexts)
-        elif nexts:
-            next_word = random.choice(nexts)
+        follow = markov.get(ctx)
+        if follow is None:
+            next_word = rng.choice(DOYLE_WORDS)
         else:
-            next_word = random.choice(DOYLE_WORDS)
+            nexts, cum, doyle_nexts, doyle_cum = follow
+            # らしさ語彙・フレーズを優先（出現数に比例して選ぶ）
+            if doyle_nexts:
+                next_word = doyle_nexts[bis(doyle_cum, rnd() * doyle_cum[-1])]
+            else:
+                next_word = nexts[bis(cum, rnd() * cum[-1])]
         out.append(next_word)
+        ctx = ctx[1:] + (next_word,)
     # 句読点・大文字補正
-    sentence = " ".join(out)
-    sentence = (
-        sentence.replace(" .", ".")
-        .replace(" ,", ",")
-        .replace(" !", "!")
-        .replace(" ?", "?")
-    )
-    sentence = sentence[0].upper() + sentence[1:]
+    sentence = _PUNCT_FIX.sub(r"\1", " ".join(out))
+    sentence = sentence[:1].upper() + sentence[1:]
     return sentence
 
 
-def main():
+def main(argv: list[str] | None = None):
     p = argparse.ArgumentParser(
         description="STEP7: 単語Markov＋コナン・ドイル語彙優先 英文生成"
     )
@@ -114,24 +145,32 @@ def main():
     p.add_argument("--num", type=int, default=5, help="生成する文の数")
     p.add_argument("--seed", type=int, default=None, help="乱数シード")
     p.add_argument("--out", default=None, help="出力ファイル (省略で標準出力)")
-    args = p.parse_args()
+    args = p.parse_args(argv)
 
     allp = Path(args.alltext)
     if not allp.exists():
         print(f"ALL_TEXT.txt が見つかりません: {allp}")
         return 2
     text = allp.read_text(encoding="utf-8", errors="replace")
-    # 1行ごとに分割し、単語化
-    words = []
-    for line in text.splitlines():
-        words.extend(tokenize(line))
+    # 単語は改行をまたがないので、行に分けずに全文を一度に単語化する。
+    # 同じ単語は sys.intern で 1 つの文字列オブジェクトにまとめる
+    words = list(map(sys.intern, tokenize(text)))
+    del text
     if not words:
         print("単語が抽出できません")
         return 2
+    # シードは最初に一度だけ設定する（文ごとに設定し直すと全文が同じになる）
+    rng = random.Random(args.seed)
     markov = build_markov(words, n=args.ngram)
+    start_candidates = find_start_candidates(markov)
     results = []
     for i in range(args.num):
-        sent = generate_sentence(markov, length=args.length, seed=args.seed)
+        sent = generate_sentence(
+            markov,
+            rng,
+            length=args.length,
+            start_candidates=start_candidates,
+        )
         results.append(sent)
     out_text = "\n".join(results)
     if args.out:
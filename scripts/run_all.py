@@ -4,50 +4,210 @@
 # Contact: reo.yamaguchi0607@gmail.com
 from __future__ import annotations
 import argparse
+import glob
+import importlib
+import multiprocessing
+import queue
+import runpy
+import shutil
+import signal
 import subprocess
 import shlex
-from datetime import datetime
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    CancelledError,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+)
+from datetime import datetime, timedelta
 from pathlib import Path
+from types import ModuleType
+from typing import IO
 import sys
 import os
 
 
+# 各ステップが前提とするステップ。依存のないコマンドどうしは同時に実行する
+# (2, 3, 4 は手順1の処理済みテキストを、5, 6 は手順4の ALL_TEXT.txt を読むだけ)。
+# 前提ステップのうち待つのは、その最初のコマンド（処理済みテキストや ALL_TEXT.txt を作るもの）
+DEPS = {1: set(), 2: {1}, 3: {1}, 4: {1}, 5: {4}, 6: {4}}
+# コマンドを順に実行するステップ（手順4の生成は直前に作る ALL_TEXT.txt を読む）。
+# それ以外のステップ内のコマンドは互いに独立
+SERIAL_STEPS = {4}
+# ログのバッファの大きさ、バッファを書き出す間隔（秒）、書き込み待ちのキューの長さ
+LOG_BUFFER_SIZE = 1 << 20
+LOG_FLUSH_INTERVAL = 5.0
+LOG_QUEUE_SIZE = 256
+# 1 つのコマンドに許す実行時間（秒）。ワーカーで実行するものも GUI も同じ
+COMMAND_TIMEOUT = 500
+# run_all 自身の生成結果の出力先
+RUN_ALL_OUTDIR = Path("Output/run_all")
+# リポジトリのルート。各スクリプトは scripts パッケージのモジュールとして実行する
+ROOT = Path(__file__).resolve().parent.parent
+# 各コマンドが出力を作ったときのコマンドライン（--no-overwrite の判定に使う）
+STAMP_DIR = RUN_ALL_OUTDIR / ".stamps"
+# 子プロセスに使うインタプリタ。起動時に一度だけ絶対パスへ解決しておく
+PYTHON = os.path.realpath(sys.executable) if sys.executable else "python3"
+
+# 各スクリプトが共通して使う標準モジュール。ワーカーの起動時に読み込んでおく
+PREIMPORT = [
+    "argparse",
+    "array",
+    "bisect",
+    "collections",
+    "csv",
+    "itertools",
+    "mmap",
+    "random",
+    "re",
+    "string",
+]
+
+# 1 つのコマンド: (引数のリスト, 入力ファイルの glob パターン, 出力ファイル)
+Command = tuple[list[str], list[str], list[str]]
+
+# ワーカープロセスの中で、コマンドを始めたことを親に知らせるキュー（preimport で受け取る）
+_started_q = None
+
+
 def parse_steps(s: str) -> list[int]:
     # accept formats like "1-6" or "1,2,4"
-    s = s.strip()
-    parts = []
+    # ステップ番号をビットの位置として 1 つの整数に OR していく。範囲 a-b は
+    # ビット a..b を立てた値を 1 回 OR するだけで済み、重複も自然に除かれる
+    mask = 0
     for token in s.split(","):
         token = token.strip()
         if not token:
             continue
         if "-" in token:
             a, b = token.split("-", 1)
-            parts.extend(range(int(a), int(b) + 1))
+            a, b = int(a), int(b)
+            if a <= b:
+                mask |= (1 << (b + 1)) - (1 << a)
         else:
-            parts.append(int(token))
-    return sorted(set(parts))
+            mask |= 1 << int(token)
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+
+def exit_code(code) -> int:
+    # sys.exit の引数を終了コードに直す（None は成功、文字列などは表示して 1）
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def load_script(module: str) -> ModuleType:
+    """スクリプトのモジュールを import する（同じワーカーでは 2 回目以降は使い回す）。
+
+    python -m と同じくリポジトリのルートを sys.path に加えて import する。こうすると
+    スクリプトが multiprocessing で起動する子プロセスからも同じ名前で import でき、
+    渡した関数を pickle できる。
+    """
+    root = str(ROOT)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return importlib.import_module(module)
 
 
-def run_cmd(cmd: str, dry_run: bool, log_f):
+def script_path(module: str) -> str:
+    """スクリプトのモジュール名を、ルートからのファイルのパスに直す。"""
+    return module.replace(".", "/") + ".py"
+
+
+def run_script(argv: list[str], spool_path: str) -> int:
+    """ワーカープロセスの中で argv[0] のモジュールの main(argv[1:]) を呼ぶ。
+
+    標準出力と標準エラーはファイル記述子ごとスプールに付け替え、終了コードを返す。
+    インタプリタの起動と import はワーカーごとに一度で済む。main を持たない
+    スクリプトは従来どおり __main__ として実行する。
+    """
+    # タイムアウトはここから数える（プールの待ち行列にいた時間は含めない）
+    if _started_q is not None:
+        _started_q.put((spool_path, os.getpid()))
+    # 開けなければ付け替える前に例外にする（呼び出し側がログに残す）
+    fd = os.open(spool_path, os.O_WRONLY | os.O_APPEND)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+    old_argv = sys.argv
+    try:
+        module = load_script(argv[0])
+        # python -m と同じく、sys.argv[0] はモジュールのファイルにする
+        sys.argv = [module.__file__ or argv[0], *argv[1:]]
+        main = getattr(module, "main", None)
+        if main is None:
+            runpy.run_module(argv[0], run_name="__main__")
+            rc = 0
+        else:
+            rc = exit_code(main(argv[1:]))
+    except SystemExit as e:
+        rc = exit_code(e.code)
+    except BaseException:
+        traceback.print_exc()
+        rc = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.argv = old_argv
+        for target, dup in enumerate(saved, start=1):
+            os.dup2(dup, target)
+            os.close(dup)
+    return rc
+
+
+def run_cmd(argv: list[str], log_f, pool: WorkerPool | None = None):
+    # 表示用の文字列は CMD 行のために一度だけ作る
+    cmd = shlex.join(argv)
     print(f"CMD: {cmd}")
     log_f.write(f"CMD: {cmd}\n")
-    if dry_run:
-        return 0, "(dry-run)"
     try:
-        # step2/step3 の GUI 実行時はタイムアウトを設ける（300秒）
-        timeout_sec = 500
-        proc = subprocess.run(
-            shlex.split(cmd),
-            capture_output=True,
-            text=True,
-            check=False,
-            timeout=timeout_sec,
-        )
-        log_f.write(proc.stdout or "")
-        log_f.write(proc.stderr or "")
-        return proc.returncode, proc.stdout + (
-            "\n" + proc.stderr if proc.stderr else ""
-        )
+        # 子プロセスの出力はメモリに溜めず、ログ用のファイルへ直接書かせる。
+        # 先に flush して、ここまでに書いた内容との順序を保つ
+        log_f.flush()
+        is_script = argv[0] == PYTHON and argv[1:2] == ["-m"]
+        if pool is not None and is_script:
+            # Python スクリプトは起動済みのワーカーで実行する（コマンドごとに
+            # インタプリタを起動しない）。別のコマンドのタイムアウトでプールが止まったら、
+            # 途中で打ち切られたコマンドも含めて下の別プロセスで実行し直す
+            try:
+                return pool.run(argv[2:], log_f.name), ""
+            except FutureTimeoutError:
+                raise subprocess.TimeoutExpired(argv, COMMAND_TIMEOUT)
+            except (BrokenExecutor, CancelledError, RuntimeError):
+                # BrokenExecutor は RuntimeError の一種。停止後の投入は RuntimeError になる
+                log_f.seek(0, os.SEEK_END)
+                log_f.write("Worker pool stopped; running in a separate process\n")
+                log_f.flush()
+            finally:
+                log_f.seek(0, os.SEEK_END)
+        # 実行ファイルが絶対パスで close_fds=False なら、CPython は fork ではなく
+        # posix_spawn で子を起動する（Python が開くファイルは既定で継承されない）
+        with subprocess.Popen(
+            argv, stdout=log_f, stderr=subprocess.STDOUT, close_fds=False
+        ) as proc:
+            try:
+                rc = proc.wait(timeout=COMMAND_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                raise
+            finally:
+                # 子プロセスが書いた分の後ろから続けて書く
+                log_f.seek(0, os.SEEK_END)
+        return rc, ""
     except subprocess.TimeoutExpired as e:
         msg = f"Timeout ({e.timeout}s) for: {cmd}\n"
         log_f.write(msg)
@@ -60,6 +220,405 @@ def run_cmd(cmd: str, dry_run: bool, log_f):
         return 2, str(e)
 
 
+def worker_context():
+    # ワーカーはスレッドを持つこのプロセスから fork せず、forkserver（なければ spawn）で作る。
+    # forkserver では共通のモジュールをサーバーが一度だけ読み込み、各ワーカーはそれを引き継ぐ
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PREIMPORT)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def preimport(modules: list[str], scripts: list[str], started_q) -> None:
+    """ワーカーの起動時に、共通のモジュールと実行予定のスクリプトを読み込んでおく。
+
+    読み込みに失敗したスクリプトは実行時にもう一度読み込み、そのときのエラーをログに残す。
+    """
+    global _started_q
+    _started_q = started_q
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    for path in scripts:
+        try:
+            load_script(path)
+        except Exception:
+            pass
+
+
+class WorkerPool:
+    """スクリプトを実行する使い回しのワーカープロセスと、各コマンドを実行中のワーカー。
+
+    ワーカーはコマンドを始めるときに (一時ファイル名, pid) を知らせてくるので、
+    タイムアウトは実際に始まった時点から数え、止まったコマンドのワーカーだけを kill できる。
+    1 つでもワーカーが異常終了すると ProcessPoolExecutor 全体が使えなくなり、
+    同時に実行中・待機中のコマンドは BrokenExecutor か CancelledError で戻る。
+    """
+
+    def __init__(self, n_workers: int, scripts: list[str]):
+        ctx = worker_context()
+        self._started_q = ctx.SimpleQueue()
+        self._started: dict[str, tuple[int, float]] = {}
+        self._cond = threading.Condition()
+        self.executor = ProcessPoolExecutor(
+            n_workers,
+            mp_context=ctx,
+            initializer=preimport,
+            initargs=(PREIMPORT, scripts, self._started_q),
+        )
+        # 受け取り側のスレッドはキューを待ったまま、プロセスの終了とともに終わる
+        threading.Thread(target=self._read_started, daemon=True).start()
+
+    def _read_started(self) -> None:
+        while True:
+            spool_path, pid = self._started_q.get()
+            with self._cond:
+                self._started[spool_path] = (pid, time.monotonic())
+                self._cond.notify_all()
+
+    def _notify(self, _fut) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self, argv: list[str], spool_path: str) -> int:
+        """ワーカーで run_script(argv, spool_path) を実行し、終了コードを返す。
+
+        始まってから COMMAND_TIMEOUT 秒で終わらなければ、そのワーカーを kill して
+        プールを止め、TimeoutError を送出する。
+        """
+        fut = self.executor.submit(run_script, argv, spool_path)
+        fut.add_done_callback(self._notify)
+        with self._cond:
+            self._cond.wait_for(lambda: spool_path in self._started or fut.done())
+            pid, started = self._started.get(spool_path, (None, time.monotonic()))
+        try:
+            return fut.result(
+                timeout=max(0.0, started + COMMAND_TIMEOUT - time.monotonic())
+            )
+        except FutureTimeoutError:
+            self.kill(pid)
+            raise
+        finally:
+            with self._cond:
+                self._started.pop(spool_path, None)
+
+    def kill(self, pid: int | None) -> None:
+        # Windows には SIGKILL がなく、os.kill の SIGTERM が TerminateProcess になる
+        if pid is not None:
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.executor.shutdown()
+
+
+def build_cmds(
+    step: int,
+    args,
+    overwrite: bool,
+    base_cmd: str,
+    gui_steps: list[int],
+    seed_part: list[str],
+) -> list[Command] | None:
+    """ステップのコマンドを (引数のリスト, 入力, 出力) の並びで返す。
+
+    入力は glob のパターンで、実行時に展開する（前のステップが作るファイルもあるため）。
+    出力を宣言しないコマンドは常に実行する。
+    """
+    # コマンドは文字列ではなく引数のリストで組み立てる（shlex で分割し直さず、
+    # パスに空白があっても壊れない）
+    cmds: list[Command] = []
+    outdir = RUN_ALL_OUTDIR
+    processed = ["examples/processed/*_processed.txt"]
+    if step == 1:
+        cmd = [base_cmd, "-m", "scripts.process1.process_unprocessed"]
+        if overwrite:
+            cmd.append("--overwrite")
+        # 出力はファイルごとに決まり、上書きしない場合の判定はスクリプト自身が行う
+        cmds.append((cmd, ["Unprocessed/*.txt"], []))
+    elif step == 2:
+        cmd = [
+            base_cmd,
+            "-m",
+            "scripts.process2.analyze_chars",
+            "--top",
+            str(args.top),
+            "--outdir",
+            "Output/process2",
+        ]
+        if step in gui_steps:
+            cmd.append("--gui")
+        outputs = [
+            f"Output/process2/char_freq_{kind}.csv"
+            for kind in ("uppercase", "lowercase", "case_insensitive", "case_sensitive")
+        ]
+        cmds.append((cmd, processed, outputs))
+    elif step == 3:
+        cmd = [
+            base_cmd,
+            "-m",
+            "scripts.process3.analyze_ngrams",
+            "--top",
+            str(args.top),
+            "--outdir",
+            "Output/process3",
+        ]
+        if step in gui_steps:
+            cmd.append("--gui")
+        outputs = ["Output/process3/bigram_freq.csv", "Output/process3/trigram_freq.csv"]
+        if args.top:
+            outputs += [
+                f"Output/process3/bigram_freq_top{args.top}.csv",
+                f"Output/process3/trigram_freq_top{args.top}.csv",
+            ]
+        cmds.append((cmd, processed, outputs))
+    elif step == 4:
+        # build ALL_TEXT.txt
+        # 後続のコマンドはこのファイルを直接読む。書いた直後なのでページキャッシュに載っており、
+        # 読み直しはメモリのコピー程度で済む（共有メモリに置いても、その作成と後始末の
+        # 手間のほうが大きい）。手順4の生成はメモリマップで、手順5・6は 1 回ずつ読む
+        cmds.append(
+            (
+                [base_cmd, "-m", "scripts.process4.build_all_text"],
+                processed,
+                ["ALL_TEXT.txt"],
+            )
+        )
+        # 文字分布からランダム生成（step4の出力）
+        out = str(outdir / "step4_chars.txt")
+        cmd = [
+            base_cmd,
+            "-m",
+            "scripts.process4.generate_chars",
+            "--mode",
+            "text",
+            "--n",
+            "100",
+            "--no-newline",
+            *seed_part,
+            "--out",
+            out,
+        ]
+        cmds.append((cmd, ["ALL_TEXT.txt"], [out]))
+    elif step == 5:
+        # 二ッ組・三ッ組を 1 回の起動でまとめて生成する（ALL_TEXT.txt の読み込みも 1 回）
+        pattern = str(outdir / "step5_ngram{n}.txt")
+        cmd = [
+            base_cmd,
+            "-m",
+            "scripts.process5.generate_ngrams",
+            "--ngrams",
+            "2,3",
+            "--length",
+            "200",
+            "--alltext",
+            "ALL_TEXT.txt",
+            *seed_part,
+            "--out-pattern",
+            pattern,
+        ]
+        cmds.append((cmd, ["ALL_TEXT.txt"], [pattern.format(n=n) for n in (2, 3)]))
+    elif step == 6:
+        # 二ッ組・三ッ組Markov も同様に 1 回でまとめて生成する
+        pattern = str(outdir / "step6_markov{n}.txt")
+        cmd = [
+            base_cmd,
+            "-m",
+            "scripts.process6.generate_markov",
+            "--ngrams",
+            "2,3",
+            "--length",
+            "200",
+            "--alltext",
+            "ALL_TEXT.txt",
+            *seed_part,
+            "--out-pattern",
+            pattern,
+        ]
+        cmds.append((cmd, ["ALL_TEXT.txt"], [pattern.format(n=n) for n in (2, 3)]))
+    else:
+        return None
+    return cmds
+
+
+def up_to_date(inputs: list[str], outputs: list[str]) -> bool:
+    """出力がすべて存在し、どの入力よりも新しければ True を返す（make と同じ判定）。"""
+    if not outputs:
+        return False
+    in_paths = [p for pattern in inputs for p in glob.glob(pattern)]
+    if not in_paths:
+        return False
+    try:
+        oldest_out = min(os.stat(p).st_mtime_ns for p in outputs)
+    except FileNotFoundError:
+        return False
+    return max(os.stat(p).st_mtime_ns for p in in_paths) <= oldest_out
+
+
+def stamp_path(argv: list[str]) -> Path:
+    """出力を作ったコマンドラインを記録するファイル（スクリプトごとに 1 つ）。"""
+    return STAMP_DIR / f"{argv[2]}.cmd"
+
+
+def same_command(argv: list[str]) -> bool:
+    """前回出力を作ったコマンドが今回と同じ引数なら True を返す。"""
+    try:
+        return stamp_path(argv).read_text(encoding="utf-8") == shlex.join(argv)
+    except FileNotFoundError:
+        return False
+
+
+def append_spool(spool: IO[str], log_f: IO[str]) -> None:
+    """一時ファイルの中身をログの末尾に写す。
+
+    子の出力はすでにファイルへ直接書かれているので、文字列にはデコードしない。
+    Linux では sendfile でカーネル内だけで写し、Python 側にバッファを持たない。
+    """
+    spool.flush()
+    log_f.flush()
+    if sys.platform == "linux":
+        src, dst = spool.fileno(), log_f.fileno()
+        size = os.fstat(src).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(dst, src, offset, size - offset)
+            if not sent:
+                break
+            offset += sent
+        # 直接書いた分の後ろから続けて書く
+        log_f.seek(0, os.SEEK_END)
+    else:
+        spool.buffer.seek(0)
+        shutil.copyfileobj(spool.buffer, log_f.buffer, length=1 << 16)
+
+
+def write_log(q: queue.Queue, log_f: IO[str]) -> None:
+    """キューから受け取った行と一時ファイルを順にログへ書く（None で終わる）。
+
+    ログに触れるのはこのスレッドだけなので、書く側はロックを取らずに put するだけでよい。
+    一時ファイルはログへ写したあと閉じて削除する。バッファは LOG_FLUSH_INTERVAL 秒ごとに
+    書き出す。
+    """
+    deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+    while True:
+        try:
+            item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            item = ""
+        if item is None:
+            return
+        if isinstance(item, str):
+            log_f.write(item)
+        else:
+            with item:
+                append_spool(item, log_f)
+            os.unlink(item.name)
+        if time.monotonic() >= deadline:
+            log_f.flush()
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+
+
+def log_in_order(
+    log_q: queue.Queue,
+    unlogged: list[tuple[int, int]],
+    spools: dict[tuple[int, int], IO[str]],
+    headed: set[int],
+) -> None:
+    """終わったコマンドの一時ファイルを、ステップ順に書き込みスレッドへ渡す。
+
+    unlogged の先頭から続けて終わっている分だけを渡して取り除く（先のコマンドが
+    終わるまで後のものは待たせる）。ステップの見出しは各ステップで一度だけ書く。
+    一時ファイルは書き込みスレッドがログへ写してから閉じる。
+    """
+    while unlogged and unlogged[0] in spools:
+        task = unlogged.pop(0)
+        if task[0] not in headed:
+            headed.add(task[0])
+            log_q.put(f"\n--- STEP {task[0]} ---\n")
+        log_q.put(spools.pop(task))
+
+
+def build_tasks(
+    steps: list[int], args, overwrite: bool, base_cmd: str, gui_steps: list[int]
+) -> dict[tuple[int, int], tuple[Command | None, set[tuple[int, int]]]]:
+    """実行するコマンドを (ステップ, 番号) -> (コマンド, 先に終わっているべきコマンド) にまとめる。"""
+    selected = set(steps)
+    # ステップによらない引数はここで一度だけ作る
+    seed_part = ["--seed", str(args.seed)] if args.seed is not None else []
+    tasks: dict[tuple[int, int], tuple[Command | None, set[tuple[int, int]]]] = {}
+    for step in steps:
+        cmds = build_cmds(step, args, overwrite, base_cmd, gui_steps, seed_part)
+        if cmds is None:
+            tasks[(step, 0)] = (None, set())
+            continue
+        for i, cmd in enumerate(cmds):
+            deps = {(d, 0) for d in DEPS.get(step, set()) & selected}
+            if step in SERIAL_STEPS and i > 0:
+                deps.add((step, i - 1))
+            tasks[(step, i)] = (cmd, deps)
+    return tasks
+
+
+def run_task(
+    step: int,
+    cmd: Command | None,
+    continue_on_error: bool,
+    skip_fresh: bool = False,
+    pool: WorkerPool | None = None,
+) -> tuple[int, IO[str]]:
+    """コマンドを 1 つ実行し、ログを書いた一時ファイルを返す。
+
+    並行するコマンドの出力と混ざらないよう、ログ本体へは書き込みスレッドがまとめて写す。
+    skip_fresh のときは、出力が入力（スクリプトと共通モジュールを含む）より新しければ実行しない。
+    """
+    # ワーカープロセスからも名前で開けるよう、名前付きの一時ファイルにする。
+    # delete=True だと Windows では開いている間に別の所から開けないので、
+    # 削除はログへ写し終えた書き込みスレッドが行う
+    spool = tempfile.NamedTemporaryFile(
+        "w+", encoding="utf-8", errors="replace", suffix=".log", delete=False
+    )
+    if cmd is None:
+        spool.write(f"Unknown step: {step}\n")
+        return 0, spool
+    argv, inputs, outputs = cmd
+    # 判定は前提のコマンドが終わった後、実行の直前に行う。
+    # --seed や --top を変えた場合も作り直すよう、前回の引数と比べる
+    if (
+        skip_fresh
+        # 入力にはスクリプト自身と共通モジュールも含める
+        and up_to_date([script_path(argv[2]), "scripts/common/*.py", *inputs], outputs)
+        and same_command(argv)
+    ):
+        print(f"Up to date, skipped: {shlex.join(argv)}")
+        spool.write(f"Up to date, skipped: {shlex.join(argv)}\n")
+        return 0, spool
+    rc, output = run_cmd(argv, spool, pool)
+    spool.write(f"RETURNCODE: {rc}\n")
+    if outputs:
+        # 上書きする実行でも記録し、次の --no-overwrite で比べられるようにする
+        if rc == 0:
+            stamp_path(argv).write_text(shlex.join(argv), encoding="utf-8")
+        else:
+            stamp_path(argv).unlink(missing_ok=True)
+    if rc != 0:
+        spool.write(f"STEP {step} failed (rc={rc})\n")
+        if not continue_on_error:
+            spool.write("Aborting due to failure\n")
+        else:
+            spool.write("Continuing despite failure as requested\n")
+    return rc, spool
+
+
 def main():
     p = argparse.ArgumentParser(
         description="Run full pipeline steps 1..6 (or subset) as an orchestrator"
@@ -78,7 +637,7 @@ def main():
     p.add_argument(
         "--no-overwrite",
         action="store_true",
-        help="Do not overwrite existing outputs (default is to overwrite)",
+        help="Do not overwrite existing outputs; skip commands whose outputs are newer than their inputs and were made with the same arguments (default is to overwrite)",
     )
     p.add_argument(
         "--dry-run", action="store_true", help="Print commands only, do not execute"
@@ -100,81 +659,110 @@ def main():
     gui_steps = parse_steps(args.gui_steps)
     overwrite = not args.no_overwrite
 
-    now = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_cmd = PYTHON
+    tasks = build_tasks(steps, args, overwrite, base_cmd, gui_steps)
+    if args.dry_run:
+        # dry-run ではディレクトリもログも作らず、実行するコマンドを順に表示するだけにする
+        print(
+            f"steps={steps} gui_steps={gui_steps} top={args.top} overwrite={overwrite} seed={args.seed}"
+        )
+        for (step, _), (cmd, _) in tasks.items():
+            if cmd is None:
+                print(f"Unknown step: {step}")
+            else:
+                print(f"CMD: {shlex.join(cmd[0])}")
+        return 0
+
+    STAMP_DIR.mkdir(parents=True, exist_ok=True)
+    # 時計は開始時に一度だけ読み、終了時刻は経過時間（monotonic）を足して求める
+    start_wall = datetime.now()
+    start_mono = time.monotonic()
+    now = start_wall.strftime("%Y%m%d_%H%M%S")
     log_dir = Path("logs")
     log_dir.mkdir(parents=True, exist_ok=True)
     log_path = log_dir / f"run_all_{now}.log"
 
-    with log_path.open("w", encoding="utf-8") as log_f:
-        log_f.write(f"run_all start: {datetime.now().isoformat()}\n")
-        log_f.write(
-            f"steps={steps} gui_steps={gui_steps} top={args.top} overwrite={overwrite} seed={args.seed}\n"
-        )
+    # ログは 1 MiB のバッファにため、書き込みは専用のスレッドがキュー経由でまとめて行う
+    # （一定間隔で flush するので、途中で落ちてもそこまでのログはほぼ残る）。
+    # fsync は終了時に一度だけ
+    with log_path.open("w", encoding="utf-8", buffering=LOG_BUFFER_SIZE) as log_f:
+        log_q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        writer = threading.Thread(target=write_log, args=(log_q, log_f), daemon=True)
+        writer.start()
+        try:
+            log_q.put(f"run_all start: {start_wall.isoformat()}\n")
+            log_q.put(
+                f"steps={steps} gui_steps={gui_steps} top={args.top} overwrite={overwrite} seed={args.seed}\n"
+            )
 
-        base_cmd = sys.executable or "python3"
-
-        for step in steps:
-            log_f.write(f"\n--- STEP {step} ---\n")
-            cmds = []
-            outdir = Path("Output/run_all")
-            outdir.mkdir(parents=True, exist_ok=True)
-            if step == 1:
-                cmd = f"{base_cmd} scripts/process1/process_unprocessed.py"
-                if overwrite:
-                    cmd += " --overwrite"
-                cmds.append(cmd)
-            elif step == 2:
-                cmd = f"{base_cmd} scripts/process2/analyze_chars.py --top {args.top} --outdir Output/process2"
-                if step in gui_steps:
-                    cmd += " --gui"
-                cmds.append(cmd)
-            elif step == 3:
-                cmd = f"{base_cmd} scripts/process3/analyze_ngrams.py --top {args.top} --outdir Output/process3"
-                if step in gui_steps:
-                    cmd += " --gui"
-                cmds.append(cmd)
-            elif step == 4:
-                # build ALL_TEXT.txt
-                cmds.append(f"{base_cmd} scripts/process4/build_all_text.py")
-                # 文字分布からランダム生成（step4の出力）
-                cmds.append(
-                    f"{base_cmd} scripts/process4/generate_chars.py --mode text --n 100 --no-newline --out {outdir}/step4_chars.txt"
-                )
-            elif step == 5:
-                # 二ッ組
-                cmds.append(
-                    f"{base_cmd} scripts/process5/generate_ngrams.py --ngram 2 --length 200 --alltext ALL_TEXT.txt --out {outdir}/step5_ngram2.txt"
-                )
-                # 三ッ組
-                cmds.append(
-                    f"{base_cmd} scripts/process5/generate_ngrams.py --ngram 3 --length 200 --alltext ALL_TEXT.txt --out {outdir}/step5_ngram3.txt"
-                )
-            elif step == 6:
-                seed_part = f" --seed {args.seed}" if args.seed is not None else ""
-                # 二ッ組Markov
-                cmds.append(
-                    f"{base_cmd} scripts/process6/generate_markov.py --ngram 2 --length 200 --alltext ALL_TEXT.txt{seed_part} --out {outdir}/step6_markov2.txt"
-                )
-                # 三ッ組Markov
-                cmds.append(
-                    f"{base_cmd} scripts/process6/generate_markov.py --ngram 3 --length 200 --alltext ALL_TEXT.txt{seed_part} --out {outdir}/step6_markov3.txt"
-                )
-            else:
-                log_f.write(f"Unknown step: {step}\n")
-
-            for cmd in cmds:
-                rc, output = run_cmd(cmd, args.dry_run, log_f)
-                log_f.write(f"RETURNCODE: {rc}\n")
-                if rc != 0:
-                    log_f.write(f"STEP {step} failed (rc={rc})\n")
-                    print(f"STEP {step} failed (rc={rc}) — see {log_path}")
-                    if not args.continue_on_error:
-                        log_f.write("Aborting due to failure\n")
-                        return rc
-                    else:
-                        log_f.write("Continuing despite failure as requested\n")
-
-        log_f.write(f"run_all finished: {datetime.now().isoformat()}\n")
+            # 依存が満たされたコマンドから順にスレッドで実行する。GUI を出すコマンドは
+            # 画面を取り合わないよう 1 本だけのレーンで順に、Tk がプロセスを占有できるよう
+            # 別プロセスとして起動する。それ以外の Python スクリプトは使い回すワーカー
+            # プロセスで実行する。
+            # ログは各コマンドの出力を一時ファイルで受け取り、書き込みスレッドだけが書き込む
+            pending = list(tasks)
+            done: set[tuple[int, int]] = set()
+            # 終わったコマンドの一時ファイルは、ステップ順（tasks の順）に並べてからログへ渡す
+            unlogged = list(tasks)
+            spools: dict[tuple[int, int], IO[str]] = {}
+            headed: set[int] = set()
+            running = {}
+            failed_rc = 0
+            n_workers = max(1, min(len(tasks), os.cpu_count() or 1))
+            # ワーカーで実行するスクリプトは、起動時にまとめて読み込ませておく
+            scripts = sorted(
+                {
+                    cmd[0][2]
+                    for (step, _), (cmd, _) in tasks.items()
+                    if cmd is not None and step not in gui_steps
+                }
+            )
+            pool = WorkerPool(n_workers, scripts)
+            with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as ex, ThreadPoolExecutor(
+                max_workers=1
+            ) as gui_ex, pool:
+                while pending or running:
+                    if not failed_rc:
+                        ready = [t for t in pending if tasks[t][1] <= done]
+                        for task in ready:
+                            pending.remove(task)
+                            step = task[0]
+                            gui = step in gui_steps
+                            fut = (gui_ex if gui else ex).submit(
+                                run_task,
+                                step,
+                                tasks[task][0],
+                                args.continue_on_error,
+                                # GUI は表示すること自体が目的なので、出力が新しくても実行する
+                                not overwrite and not gui,
+                                None if gui else pool,
+                            )
+                            running[fut] = task
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        task = running.pop(fut)
+                        rc, spools[task] = fut.result()
+                        log_in_order(log_q, unlogged, spools, headed)
+                        done.add(task)
+                        if rc != 0:
+                            print(f"STEP {task[0]} failed (rc={rc}) — see {log_path}")
+                            if not args.continue_on_error and not failed_rc:
+                                failed_rc = rc
+            # 中断して実行しなかったコマンドは飛ばし、残りを順に書く
+            unlogged[:] = [t for t in unlogged if t in spools]
+            log_in_order(log_q, unlogged, spools, headed)
+            if failed_rc:
+                return failed_rc
+
+            finished_at = start_wall + timedelta(seconds=time.monotonic() - start_mono)
+            log_q.put(f"run_all finished: {finished_at.isoformat()}\n")
+        finally:
+            log_q.put(None)
+            writer.join()
+            log_f.flush()
+            os.fsync(log_f.fileno())
 
     print(f"run_all finished. Log: {log_path}")
     return 0